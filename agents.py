@@ -1,4 +1,6 @@
+import functools
 import os
+import re
 from dotenv import load_dotenv
 from crewai import Agent, LLM
 
@@ -7,11 +9,62 @@ from tools import read_financial_document
 load_dotenv()
 
 
+LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.1"))
+
+# The expected_output contract in task.py names these sections; a local-model
+# answer missing any of them (or hedging with low confidence) is escalated.
+_REQUIRED_SECTIONS = ("Summary", "Opportunities", "Risks", "Recommendation")
+_LOW_CONFIDENCE_RE = re.compile(r"confidence[^a-z]{0,20}low", re.IGNORECASE)
+
+
+class RouterLLM(LLM):
+    """LLM that tries a cheap local model first and escalates on weak output.
+
+    Routine analyses run against a local OpenAI-compatible endpoint (e.g. a
+    quantized model behind vLLM); only answers that miss the required report
+    sections or self-report low confidence are re-run on the premium model.
+    """
+
+    def __init__(self, premium: LLM, **local_kwargs):
+        super().__init__(**local_kwargs)
+        self._premium = premium
+
+    def call(self, *args, **kwargs):
+        output = super().call(*args, **kwargs)
+        if self._is_acceptable(str(output)):
+            return output
+        return self._premium.call(*args, **kwargs)
+
+    @staticmethod
+    def _is_acceptable(output: str) -> bool:
+        # Intermediate ReAct steps (tool selection) never contain the report
+        # sections; only final answers are held to the section/confidence bar.
+        if "Action:" in output:
+            return True
+        if any(section not in output for section in _REQUIRED_SECTIONS):
+            return False
+        return not _LOW_CONFIDENCE_RE.search(output)
+
+
+@functools.lru_cache(maxsize=1)
 def _build_llm() -> LLM:
     model = os.getenv("OPENAI_MODEL", "openai/gpt-4o-mini")
-    return LLM(model=model, temperature=0.1)
+    premium = LLM(model=model, temperature=LLM_TEMPERATURE)
+
+    local_base_url = os.getenv("LOCAL_LLM_BASE_URL")
+    if not local_base_url:
+        return premium
+
+    local_model = os.getenv("LOCAL_LLM_MODEL", "openai/Meta-Llama-3.1-8B-Instruct")
+    return RouterLLM(
+        premium,
+        model=local_model,
+        base_url=local_base_url,
+        temperature=LLM_TEMPERATURE,
+    )
 
 
+@functools.lru_cache(maxsize=1)
 def create_financial_analyst() -> Agent:
     return Agent(
         role="Senior Financial Analyst",
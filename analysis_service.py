@@ -1,24 +1,82 @@
 import os
 
+import redis
 from crewai import Crew, Process
 
-from agents import create_financial_analyst
+from agents import LLM_TEMPERATURE, create_financial_analyst
+from llm_cache import REDIS_URL, LLMCache, hash_file
 from task import build_analysis_task
 
+# Intermediate agent output is published here so /jobs/{id}/stream clients
+# see progress before the job completes.
+TOKEN_CHANNEL_TEMPLATE = "job:{job_id}:tokens"
+STREAM_DONE_SENTINEL = "[DONE]"
+_stream_redis = redis.Redis.from_url(REDIS_URL)
 
-def run_crew(query: str, file_path: str) -> str:
-    """Run CrewAI analysis for a given document path and user query."""
-    analyst = create_financial_analyst()
-    analysis_task = build_analysis_task(analyst)
+# Cached analyses are only reused when sampling is near-deterministic, so a
+# stored answer is an acceptable stand-in for a fresh LLM call.
+_CACHE_MAX_TEMPERATURE = 0.1
+_llm_cache = LLMCache()
+
+
+def _cache_enabled() -> bool:
+    return LLM_TEMPERATURE <= _CACHE_MAX_TEMPERATURE
+
+
+def _publish_stream(job_id: str, message: str) -> None:
+    try:
+        _stream_redis.publish(TOKEN_CHANNEL_TEMPLATE.format(job_id=job_id), message)
+    except redis.RedisError:
+        pass
+
+
+def run_crew(query: str, file_path: str, job_id: str | None = None) -> str:
+    """Run CrewAI analysis for a given document path and user query.
+
+    When a job_id is given, intermediate step output is published to the
+    job's Redis token channel for live streaming.
+    """
+    doc_hash = hash_file(file_path)
+    if _cache_enabled():
+        cached = _llm_cache.get(query, doc_hash)
+        if cached is not None:
+            if job_id:
+                _publish_stream(job_id, cached)
+                _publish_stream(job_id, STREAM_DONE_SENTINEL)
+            return cached
+
+    step_callback = None
+    if job_id:
+        step_callback = lambda step: _publish_stream(job_id, str(step))
+
+    # kickoff interpolates {query}/{file_path} into the task description and
+    # the agent goal in place, and the wait=true thread pool can run several
+    # crews at once in the API process — so each run gets cheap clones of the
+    # cached templates instead of the shared objects themselves.
+    base_analyst = create_financial_analyst()
+    analyst = base_analyst.model_copy()
+    analysis_task = build_analysis_task(base_analyst).model_copy(
+        update={"agent": analyst}
+    )
 
     financial_crew = Crew(
         agents=[analyst],
         tasks=[analysis_task],
         process=Process.sequential,
+        step_callback=step_callback,
     )
 
     result = financial_crew.kickoff(inputs={"query": query, "file_path": file_path})
-    return str(result)
+    analysis = str(result)
+
+    if job_id:
+        # Publish the full analysis before the sentinel so stream clients do
+        # not depend on the job row being committed as completed yet.
+        _publish_stream(job_id, analysis)
+        _publish_stream(job_id, STREAM_DONE_SENTINEL)
+    if _cache_enabled():
+        _llm_cache.set(query, doc_hash, analysis)
+    return analysis
 
 
 def ensure_openai_key() -> None:
@@ -2,6 +2,7 @@ import os
 
 from celery import Celery
 from dotenv import load_dotenv
+from kombu import Queue
 
 load_dotenv()
 
@@ -13,10 +14,27 @@ celery_app = Celery(
     backend=REDIS_URL,
 )
 
+# Analysis tasks run for many seconds (PDF parse + LLM), so workers take one
+# task at a time, ack only after completion, and are recycled periodically to
+# curb memory creep from CrewAI/LLM clients. Start workers with -Ofair so
+# tasks go to free workers instead of being prefetched by busy ones.
 celery_app.conf.update(
     task_serializer="json",
     result_serializer="json",
     accept_content=["json"],
     task_track_started=True,
+    task_acks_late=True,
     worker_prefetch_multiplier=1,
+    worker_max_tasks_per_child=50,
+    # Analysis jobs are request-scoped and re-queueable from the jobs table,
+    # so the queue is declared transient: no broker persistence overhead.
+    task_queues=(Queue("analysis", durable=False, no_ack=False),),
+    task_default_queue="analysis",
+    task_routes={"analyze_financial_document": {"queue": "analysis"}},
+    broker_transport_options={
+        "socket_keepalive": True,
+        "visibility_timeout": 3600,
+        "fanout_prefix": True,
+        "fanout_patterns": True,
+    },
 )
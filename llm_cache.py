@@ -0,0 +1,188 @@
+import hashlib
+import mmap
+import os
+
+import redis
+from dotenv import load_dotenv
+from redis.commands.search.field import TagField, TextField, VectorField
+from redis.commands.search.indexDefinition import IndexDefinition, IndexType
+from redis.commands.search.query import Query
+
+try:
+    from sentence_transformers import SentenceTransformer
+except ImportError:  # semantic layer is optional; exact-match layer still works
+    SentenceTransformer = None
+
+load_dotenv()
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+_EXACT_PREFIX = "llmcache:exact:"
+_VECTOR_PREFIX = "llmcache:vec:"
+_VECTOR_INDEX = "llmcache_queries"
+_EMBEDDING_MODEL = "all-MiniLM-L6-v2"
+_EMBEDDING_DIM = 384
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def hash_file(path: str) -> str:
+    """Return the SHA-256 hex digest of a file's contents.
+
+    Large reads let OpenSSL's SHA-NI implementation run at full speed;
+    file_digest (Py 3.11+) streams in big buffers without loading the file
+    into a Python bytes object, and the mmap fallback feeds the whole
+    mapping to a single update().
+    """
+    with open(path, "rb") as f:
+        if hasattr(hashlib, "file_digest"):
+            return hashlib.file_digest(f, "sha256").hexdigest()
+        digest = hashlib.sha256()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            digest.update(mapped)
+        return digest.hexdigest()
+
+
+class LLMCache:
+    """Two-layer cache for LLM analysis results, backed by Redis.
+
+    Layer 1 is an exact lookup keyed by SHA-256 of the normalized query plus
+    the document hash. Layer 2 embeds the query locally and searches a
+    RediSearch vector index scoped to the same document, returning the stored
+    analysis when cosine similarity meets the threshold. Layer 2 is only
+    active when sentence-transformers is installed.
+    """
+
+    def __init__(
+        self,
+        redis_url: str = REDIS_URL,
+        ttl_seconds: int = 3600,
+        similarity_threshold: float = 0.92,
+    ):
+        self._redis = redis.Redis.from_url(redis_url)
+        self._ttl_seconds = ttl_seconds
+        self._similarity_threshold = similarity_threshold
+        self._embedder = None
+        self._index_ready = False
+        self.stats = {"exact_hits": 0, "semantic_hits": 0, "misses": 0}
+
+    def get(self, query: str, doc_hash: str) -> str | None:
+        try:
+            cached = self._redis.get(self._exact_key(query, doc_hash))
+        except redis.RedisError:
+            return None
+        if cached is not None:
+            self.stats["exact_hits"] += 1
+            return cached.decode("utf-8")
+
+        analysis = self._semantic_lookup(query, doc_hash)
+        if analysis is not None:
+            self.stats["semantic_hits"] += 1
+            return analysis
+
+        self.stats["misses"] += 1
+        return None
+
+    def set(self, query: str, doc_hash: str, analysis_text: str) -> None:
+        try:
+            self._redis.set(
+                self._exact_key(query, doc_hash), analysis_text, ex=self._ttl_seconds
+            )
+        except redis.RedisError:
+            return
+
+        embedding = self._embed(query)
+        if embedding is None or not self._ensure_index():
+            return
+        entry_key = self._vector_key(query, doc_hash)
+        try:
+            self._redis.hset(
+                entry_key,
+                mapping={
+                    "doc_hash": doc_hash,
+                    "analysis_text": analysis_text,
+                    "embedding": embedding.tobytes(),
+                },
+            )
+            self._redis.expire(entry_key, self._ttl_seconds)
+        except redis.RedisError:
+            pass
+
+    def _exact_key(self, query: str, doc_hash: str) -> str:
+        digest = hashlib.sha256(
+            (_normalize_query(query) + doc_hash).encode("utf-8")
+        ).hexdigest()
+        return f"{_EXACT_PREFIX}{digest}"
+
+    def _vector_key(self, query: str, doc_hash: str) -> str:
+        query_digest = hashlib.sha256(_normalize_query(query).encode("utf-8")).hexdigest()
+        return f"{_VECTOR_PREFIX}{doc_hash}:{query_digest}"
+
+    def _embed(self, query: str):
+        if SentenceTransformer is None:
+            return None
+        if self._embedder is None:
+            self._embedder = SentenceTransformer(_EMBEDDING_MODEL)
+        embedding = self._embedder.encode(_normalize_query(query))
+        return embedding.astype("float32")
+
+    def _ensure_index(self) -> bool:
+        if self._index_ready:
+            return True
+        index = self._redis.ft(_VECTOR_INDEX)
+        try:
+            index.info()
+        except redis.ResponseError:
+            try:
+                index.create_index(
+                    [
+                        TagField("doc_hash"),
+                        TextField("analysis_text"),
+                        VectorField(
+                            "embedding",
+                            "FLAT",
+                            {
+                                "TYPE": "FLOAT32",
+                                "DIM": _EMBEDDING_DIM,
+                                "DISTANCE_METRIC": "COSINE",
+                            },
+                        ),
+                    ],
+                    definition=IndexDefinition(
+                        prefix=[_VECTOR_PREFIX], index_type=IndexType.HASH
+                    ),
+                )
+            except redis.RedisError:
+                return False
+        except redis.RedisError:
+            return False
+        self._index_ready = True
+        return True
+
+    def _semantic_lookup(self, query: str, doc_hash: str) -> str | None:
+        embedding = self._embed(query)
+        if embedding is None or not self._ensure_index():
+            return None
+
+        knn_query = (
+            Query(f"(@doc_hash:{{{doc_hash}}})=>[KNN 1 @embedding $vec AS distance]")
+            .sort_by("distance")
+            .return_fields("analysis_text", "distance")
+            .dialect(2)
+        )
+        try:
+            results = self._redis.ft(_VECTOR_INDEX).search(
+                knn_query, query_params={"vec": embedding.tobytes()}
+            )
+        except redis.RedisError:
+            return None
+        if not results.docs:
+            return None
+
+        top = results.docs[0]
+        similarity = 1.0 - float(top.distance)
+        if similarity < self._similarity_threshold:
+            return None
+        return top.analysis_text
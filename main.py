@@ -1,32 +1,89 @@
+import asyncio
+import concurrent.futures
+import functools
+import io
 import os
 import re
-import shutil
+import time
 import uuid
 from datetime import datetime, timezone
 from pathlib import Path
 
-from fastapi import Depends, FastAPI, File, Form, HTTPException, UploadFile
+import aiofiles
+import redis
+from fastapi import Depends, FastAPI, File, Form, HTTPException, Query, UploadFile
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from celery.result import AsyncResult
 from dotenv import load_dotenv
-from sqlalchemy.orm import Session
-
-from celery_app import celery_app
-from database import get_session, init_db
+from sqlalchemy import func
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.orm import Session, selectinload
+
+from analysis_service import STREAM_DONE_SENTINEL, TOKEN_CHANNEL_TEMPLATE, run_crew
+from celery_app import REDIS_URL, celery_app
+from database import SessionLocal, get_session, init_db
 from models import AnalysisJob, User
 
 load_dotenv()
 
-app = FastAPI(title="Financial Document Analyzer")
+# orjson serializes dicts/lists and datetimes in C, which matters for job
+# listings with hundreds of rows.
+app = FastAPI(title="Financial Document Analyzer", default_response_class=ORJSONResponse)
 
 DATA_DIR = Path("data/uploads")
 DEFAULT_QUERY = "Analyze this financial document for investment insights"
+MAX_UPLOAD_BYTES = 50 * 1024 * 1024
+
+_UNSAFE_FILENAME_RE = re.compile(r"[^A-Za-z0-9._-]")
+
+# Chunk size for upload writes; also the size above which Starlette spools
+# uploads to disk, making the sendfile fast path applicable.
+_COPY_BUFFER_SIZE = 1024 * 1024
+
+_STREAM_CHUNK_SIZE = 8192
+_STREAM_POLL_SECONDS = 5.0
+_stream_redis = redis.Redis.from_url(REDIS_URL)
+
+# Below this size, the broker round-trip dominates the analysis itself, so
+# wait=true runs the crew inline instead of queueing.
+_SYNC_MAX_BYTES = 256 * 1024
+_crew_executor = concurrent.futures.ThreadPoolExecutor(max_workers=4)
 
 
 def _sanitize_filename(filename: str) -> str:
-    safe_name = re.sub(r"[^A-Za-z0-9._-]", "_", filename)
+    safe_name = _UNSAFE_FILENAME_RE.sub("_", filename)
     return safe_name[:120] or "uploaded.pdf"
 
 
+def _sendfile_upload(src, dest: Path, size: int) -> None:
+    # Kernel-space copy between the spooled temp file and the destination;
+    # raises if the source has no real file descriptor.
+    with dest.open("wb") as out_file:
+        offset = 0
+        while offset < size:
+            sent = os.sendfile(out_file.fileno(), src.fileno(), offset, size - offset)
+            if sent == 0:
+                break
+            offset += sent
+
+
+async def _save_upload(file: UploadFile, dest: Path) -> None:
+    loop = asyncio.get_running_loop()
+    # os.sendfile does not exist on Windows.
+    if hasattr(os, "sendfile") and file.size and file.size > _COPY_BUFFER_SIZE:
+        try:
+            await loop.run_in_executor(None, _sendfile_upload, file.file, dest, file.size)
+            return
+        except (OSError, ValueError, io.UnsupportedOperation):
+            pass
+
+    await file.seek(0)
+    async with aiofiles.open(dest, "wb") as out_file:
+        while chunk := await file.read(_COPY_BUFFER_SIZE):
+            await out_file.write(chunk)
+
+
 def _resolve_query(query: str | None) -> str:
     resolved = (query or DEFAULT_QUERY).strip()
     return resolved or DEFAULT_QUERY
@@ -39,19 +96,67 @@ def _get_or_create_user(session: Session, name: str | None, email: str | None) -
     if not normalized_email and not normalized_name:
         return None
 
-    if normalized_email:
-        user = session.query(User).filter(User.email == normalized_email).first()
-        if user:
-            if normalized_name and not user.name:
-                user.name = normalized_name
-                session.commit()
-            return user
+    if not normalized_email:
+        # No unique key to upsert on; name-only users are always new rows.
+        user = User(name=normalized_name, email=None)
+        session.add(user)
+        session.commit()
+        session.refresh(user)
+        return user
+
+    # Atomic INSERT ... ON CONFLICT: one round-trip, and concurrent uploads
+    # for the same email can no longer race a SELECT-then-INSERT window.
+    insert_fn = sqlite_insert if session.get_bind().dialect.name == "sqlite" else pg_insert
+    stmt = insert_fn(User).values(name=normalized_name, email=normalized_email)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[User.email],
+        set_={"name": func.coalesce(User.name, stmt.excluded.name)},
+    ).returning(User.id)
+    user_id = session.execute(stmt).scalar_one()
+    session.commit()
+    return session.get(User, user_id)
+
+
+async def _run_analysis_inline(
+    session: Session, db_job: AnalysisJob, resolved_query: str, file_path: Path
+) -> ORJSONResponse:
+    """Run the crew synchronously for small documents, skipping the broker."""
+    db_job.status = "processing"
+    session.commit()
+
+    try:
+        analysis = await asyncio.get_running_loop().run_in_executor(
+            _crew_executor,
+            functools.partial(run_crew, resolved_query, str(file_path), db_job.job_id),
+        )
+    except Exception as exc:
+        db_job.status = "failed"
+        db_job.error_message = str(exc)
+        db_job.completed_at = datetime.now(timezone.utc)
+        session.commit()
+        file_path.unlink(missing_ok=True)
+        raise HTTPException(status_code=500, detail=f"Analysis failed: {exc}")
 
-    user = User(name=normalized_name, email=normalized_email)
-    session.add(user)
+    db_job.status = "completed"
+    db_job.analysis_text = analysis
+    db_job.completed_at = datetime.now(timezone.utc)
     session.commit()
-    session.refresh(user)
-    return user
+    file_path.unlink(missing_ok=True)
+
+    return ORJSONResponse(
+        status_code=200,
+        content={
+            "job_id": db_job.job_id,
+            "status": "completed",
+            "result": {
+                "status": "success",
+                "query": db_job.query,
+                "analysis": analysis,
+                "file_processed": db_job.file_name,
+                "user_id": db_job.user_id,
+            },
+        },
+    )
 
 
 @app.on_event("startup")
@@ -71,6 +176,7 @@ async def root():
 async def analyze_document(
     file: UploadFile = File(...),
     query: str = Form(default=DEFAULT_QUERY),
+    wait: bool = Form(default=False),
     user_name: str | None = Form(default=None),
     user_email: str | None = Form(default=None),
     session: Session = Depends(get_session),
@@ -81,6 +187,17 @@ async def analyze_document(
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are supported")
 
+    # Reject bad sizes before writing anything to disk. file.size is None for
+    # chunked uploads, so the post-copy stat below stays as a backstop.
+    if file.size is not None and file.size == 0:
+        raise HTTPException(status_code=400, detail="Uploaded PDF is empty")
+
+    if file.size is not None and file.size > MAX_UPLOAD_BYTES:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Uploaded PDF exceeds the {MAX_UPLOAD_BYTES} byte limit",
+        )
+
     if not os.getenv("OPENAI_API_KEY"):
         raise HTTPException(
             status_code=500,
@@ -95,8 +212,7 @@ async def analyze_document(
     resolved_query = _resolve_query(query)
 
     try:
-        with file_path.open("wb") as out_file:
-            shutil.copyfileobj(file.file, out_file)
+        await _save_upload(file, file_path)
 
         if file_path.stat().st_size == 0:
             file_path.unlink(missing_ok=True)
@@ -117,14 +233,24 @@ async def analyze_document(
         session.add(db_job)
         session.commit()
 
-        celery_app.send_task(
-            "analyze_financial_document",
-            kwargs={
-                "query": resolved_query,
-                "file_path": str(file_path),
-                "original_filename": file.filename,
-            },
-            task_id=job_id,
+        if wait and file.size is not None and file.size < _SYNC_MAX_BYTES:
+            return await _run_analysis_inline(session, db_job, resolved_query, file_path)
+
+        # send_task publishes synchronously over the broker socket; run it in
+        # the default executor so the event loop is not blocked. Celery reuses
+        # a pooled producer connection, so no handshake is paid per request.
+        await asyncio.get_running_loop().run_in_executor(
+            None,
+            functools.partial(
+                celery_app.send_task,
+                "analyze_financial_document",
+                kwargs={
+                    "query": resolved_query,
+                    "file_path": str(file_path),
+                    "original_filename": file.filename,
+                },
+                task_id=job_id,
+            ),
         )
 
         return {
@@ -149,22 +275,47 @@ async def analyze_document(
         )
 
 
+@app.get("/jobs")
+async def get_jobs_bulk(
+    ids: list[str] = Query(...), session: Session = Depends(get_session)
+):
+    """Fetch the status of several jobs in one SQL query instead of N polls."""
+    db_jobs = session.query(AnalysisJob).filter(AnalysisJob.job_id.in_(ids)).all()
+    jobs_by_id = {job.job_id: job for job in db_jobs}
+
+    statuses = []
+    promoted = False
+    for job_id in ids:
+        db_job = jobs_by_id.get(job_id)
+        if db_job is None:
+            statuses.append({"job_id": job_id, "status": "not_found"})
+            continue
+
+        # Terminal jobs never need a Celery backend lookup.
+        if db_job.status == "queued":
+            state = AsyncResult(job_id, app=celery_app).state
+            if state in {"STARTED", "RETRY"}:
+                db_job.status = "processing"
+                promoted = True
+
+        entry = {"job_id": job_id, "status": db_job.status}
+        if db_job.status == "failed":
+            entry["error"] = db_job.error_message
+        statuses.append(entry)
+
+    if promoted:
+        session.commit()
+    return {"jobs": statuses}
+
+
 @app.get("/jobs/{job_id}")
 async def get_job_status(job_id: str, session: Session = Depends(get_session)):
     db_job = session.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
     if not db_job:
         raise HTTPException(status_code=404, detail="Job not found")
 
-    result = AsyncResult(job_id, app=celery_app)
-    state = result.state
-
-    if state in {"STARTED", "RETRY"} and db_job.status == "queued":
-        db_job.status = "processing"
-        session.commit()
-
-    if db_job.status in {"queued", "processing"}:
-        return {"job_id": job_id, "status": db_job.status}
-
+    # Terminal states are authoritative in the DB; skip the Celery backend
+    # round-trip entirely so polling a finished job costs one SQL query.
     if db_job.status == "completed":
         return {
             "job_id": job_id,
@@ -179,28 +330,115 @@ async def get_job_status(job_id: str, session: Session = Depends(get_session)):
         }
 
     if db_job.status == "failed":
+        error = db_job.error_message
+        if error is None:
+            error = str(AsyncResult(job_id, app=celery_app).result)
         return {
             "job_id": job_id,
             "status": "failed",
-            "error": db_job.error_message or str(result.result),
+            "error": error,
             "user_id": db_job.user_id,
         }
 
+    if db_job.status == "queued":
+        state = AsyncResult(job_id, app=celery_app).state
+        if state in {"STARTED", "RETRY"}:
+            db_job.status = "processing"
+            session.commit()
+
     return {"job_id": job_id, "status": db_job.status}
 
 
+def _sse_event(payload: str) -> str:
+    lines = payload.splitlines() or [""]
+    return "".join(f"data: {line}\n" for line in lines) + "\n"
+
+
+def _chunked_sse(text: str):
+    for start in range(0, len(text), _STREAM_CHUNK_SIZE):
+        yield _sse_event(text[start : start + _STREAM_CHUNK_SIZE])
+
+
+def _load_job_snapshot(job_id: str) -> tuple[str, str | None] | None:
+    session = SessionLocal()
+    try:
+        db_job = session.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
+        if db_job is None:
+            return None
+        return db_job.status, db_job.analysis_text
+    finally:
+        session.close()
+
+
+def _live_job_stream(job_id: str):
+    pubsub = _stream_redis.pubsub(ignore_subscribe_messages=True)
+    done_received = False
+    streamed_payload = False
+    try:
+        pubsub.subscribe(TOKEN_CHANNEL_TEMPLATE.format(job_id=job_id))
+        while True:
+            message = pubsub.get_message(timeout=_STREAM_POLL_SECONDS)
+            if message is None:
+                # No tokens lately; stop if the job finished while we waited.
+                snapshot = _load_job_snapshot(job_id)
+                if snapshot is None or snapshot[0] in {"completed", "failed"}:
+                    break
+                continue
+            payload = message["data"].decode("utf-8", errors="replace")
+            if payload == STREAM_DONE_SENTINEL:
+                done_received = True
+                break
+            streamed_payload = True
+            yield _sse_event(payload)
+    except redis.RedisError:
+        pass
+    finally:
+        pubsub.close()
+
+    # run_crew publishes the full analysis just before the sentinel, so a
+    # stream that saw both is already complete.
+    if done_received and streamed_payload:
+        return
+
+    # Otherwise fall back to the stored result, allowing the worker a moment
+    # to commit the completed row after the sentinel.
+    snapshot = None
+    for _ in range(int(_STREAM_POLL_SECONDS)):
+        snapshot = _load_job_snapshot(job_id)
+        if snapshot is None or snapshot[0] in {"completed", "failed"}:
+            break
+        time.sleep(1)
+    if snapshot and snapshot[0] == "completed" and snapshot[1]:
+        yield from _chunked_sse(snapshot[1])
+
+
+@app.get("/jobs/{job_id}/stream")
+async def stream_job(job_id: str, session: Session = Depends(get_session)):
+    db_job = session.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
+    if not db_job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    if db_job.status == "completed":
+        generator = _chunked_sse(db_job.analysis_text or "")
+    elif db_job.status == "failed":
+        generator = iter([_sse_event(db_job.error_message or "Analysis failed")])
+    else:
+        generator = _live_job_stream(job_id)
+    return StreamingResponse(generator, media_type="text/event-stream")
+
+
 @app.get("/users/{user_id}/jobs")
 async def get_user_jobs(user_id: int, session: Session = Depends(get_session)):
-    user = session.query(User).filter(User.id == user_id).first()
+    user = (
+        session.query(User)
+        .options(selectinload(User.jobs))
+        .filter(User.id == user_id)
+        .first()
+    )
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
 
-    jobs = (
-        session.query(AnalysisJob)
-        .filter(AnalysisJob.user_id == user_id)
-        .order_by(AnalysisJob.created_at.desc())
-        .all()
-    )
+    jobs = sorted(user.jobs, key=lambda job: job.created_at, reverse=True)
     return {
         "user": {"id": user.id, "name": user.name, "email": user.email},
         "jobs": [
@@ -209,8 +447,8 @@ async def get_user_jobs(user_id: int, session: Session = Depends(get_session)):
                 "status": job.status,
                 "query": job.query,
                 "file_name": job.file_name,
-                "created_at": job.created_at.isoformat() if job.created_at else None,
-                "completed_at": job.completed_at.isoformat() if job.completed_at else None,
+                "created_at": job.created_at,
+                "completed_at": job.completed_at,
             }
             for job in jobs
         ],
@@ -1,22 +1,47 @@
+from typing import Final
+
 from crewai import Task
 
 from tools import read_financial_document
 
+_DESCRIPTION: Final = (
+    "Analyze the uploaded financial document at path: {file_path}. "
+    "Use the read_financial_document tool to read it first. "
+    "Then answer the user query: {query}. "
+    "Include: key performance highlights, major risks, and a balanced investment view."
+)
+_EXPECTED_OUTPUT: Final = (
+    "A concise financial analysis with these sections: "
+    "Summary, Opportunities, Risks, and Recommendation. "
+    "Recommendation must include a confidence level (low/medium/high)."
+)
+
+# The fully validated Task is built once; per-analyst tasks are cheap clones
+# that skip repeating Pydantic validation of the prompt strings.
+_template: Task | None = None
+
+# Agent instances are not hashable, so key the memo on identity rather than
+# using functools.lru_cache directly.
+_task_cache: dict[int, Task] = {}
+
+
+def _get_template() -> Task:
+    global _template
+    if _template is None:
+        _template = Task(
+            description=_DESCRIPTION,
+            expected_output=_EXPECTED_OUTPUT,
+            agent=None,
+            tools=[read_financial_document],
+            async_execution=False,
+        )
+    return _template
+
 
 def build_analysis_task(analyst) -> Task:
-    return Task(
-        description=(
-            "Analyze the uploaded financial document at path: {file_path}. "
-            "Use the read_financial_document tool to read it first. "
-            "Then answer the user query: {query}. "
-            "Include: key performance highlights, major risks, and a balanced investment view."
-        ),
-        expected_output=(
-            "A concise financial analysis with these sections: "
-            "Summary, Opportunities, Risks, and Recommendation. "
-            "Recommendation must include a confidence level (low/medium/high)."
-        ),
-        agent=analyst,
-        tools=[read_financial_document],
-        async_execution=False,
-    )
\ No newline at end of file
+    task = _task_cache.get(id(analyst))
+    if task is None:
+        task = _task_cache[id(analyst)] = _get_template().model_copy(
+            update={"agent": analyst}
+        )
+    return task
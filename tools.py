@@ -1,10 +1,46 @@
 import os
+import tempfile
+import threading
+from pathlib import Path
+
 from dotenv import load_dotenv
-from pypdf import PdfReader
+import pypdfium2 as pdfium
 from crewai.tools import BaseTool
 
+from llm_cache import hash_file
+
 load_dotenv()
 
+_TEXT_CACHE_DIR = Path("data/cache")
+
+# PDFium is not thread-safe, and the wait=true fast path can run several
+# crews at once in the API process; all extraction goes through this lock.
+_pdfium_lock = threading.Lock()
+
+
+def _read_cached_text(doc_hash: str) -> str | None:
+    cache_path = _TEXT_CACHE_DIR / f"{doc_hash}.txt"
+    try:
+        return cache_path.read_text(encoding="utf-8")
+    except OSError:
+        return None
+
+
+def _write_cached_text(doc_hash: str, text: str) -> None:
+    _TEXT_CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    cache_path = _TEXT_CACHE_DIR / f"{doc_hash}.txt"
+    # Write via tempfile + rename so concurrent readers never see a partial file.
+    fd, tmp_path = tempfile.mkstemp(dir=_TEXT_CACHE_DIR, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as tmp_file:
+            tmp_file.write(text)
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        try:
+            os.unlink(tmp_path)
+        except OSError:
+            pass
+
 
 class FinancialDocumentTool(BaseTool):
     name: str = "read_financial_document"
@@ -17,12 +53,28 @@ class FinancialDocumentTool(BaseTool):
         if not os.path.exists(path):
             raise FileNotFoundError(f"PDF file not found: {path}")
 
-        reader = PdfReader(path)
-        pages_text = []
-        for page in reader.pages:
-            pages_text.append((page.extract_text() or "").strip())
+        # The agent may re-read the same file on each iteration (max_iter=3),
+        # so extraction is cached on disk keyed by file content.
+        doc_hash = hash_file(path)
+        cached_text = _read_cached_text(doc_hash)
+        if cached_text is not None:
+            return cached_text
+
+        # Extraction stays sequential: this runs inside a daemonic Celery
+        # prefork child, which may not spawn multiprocessing children, and
+        # PDFium itself is not thread-safe.
+        with _pdfium_lock:
+            pdf = pdfium.PdfDocument(path)
+            try:
+                pages_text = [
+                    pdf[i].get_textpage().get_text_range() for i in range(len(pdf))
+                ]
+            finally:
+                pdf.close()
 
-        return "\n\n".join(text for text in pages_text if text)
+        document_text = "\n\n".join(text.strip() for text in pages_text if text.strip())
+        _write_cached_text(doc_hash, document_text)
+        return document_text
 
 
 read_financial_document = FinancialDocumentTool()
@@ -1,21 +1,33 @@
 from datetime import datetime, timezone
 from pathlib import Path
 
+from celery.signals import worker_process_init
+from sqlalchemy import update
+
 from celery_app import celery_app
+from agents import create_financial_analyst
 from analysis_service import ensure_openai_key, run_crew
 from database import SessionLocal
 from models import AnalysisJob
+from task import build_analysis_task
+
+
+@worker_process_init.connect
+def _warm_agent_cache(**kwargs) -> None:
+    # Build the cached analyst/task once per worker process so no request
+    # pays the construction cost and no two threads race the caches.
+    analyst = create_financial_analyst()
+    build_analysis_task(analyst)
 
 
 def _update_job(job_id: str, **fields) -> None:
+    # One parameterized UPDATE per status transition; no SELECT round-trip.
     session = SessionLocal()
     try:
-        job = session.query(AnalysisJob).filter(AnalysisJob.job_id == job_id).first()
-        if not job:
-            return
-        for key, value in fields.items():
-            setattr(job, key, value)
-        session.commit()
+        with session.begin():
+            session.execute(
+                update(AnalysisJob).where(AnalysisJob.job_id == job_id).values(**fields)
+            )
     finally:
         session.close()
 
@@ -32,7 +44,7 @@ def analyze_financial_document_task(self, query: str, file_path: str, original_f
         if not path.exists():
             raise FileNotFoundError(f"Uploaded file not found: {file_path}")
 
-        analysis = run_crew(query=query, file_path=file_path)
+        analysis = run_crew(query=query, file_path=file_path, job_id=job_id)
 
         payload = {
             "status": "success",